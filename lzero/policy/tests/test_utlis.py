@@ -1,8 +1,14 @@
 import pytest
 import torch
 import numpy as np
+from scipy.stats import entropy
+import torch.nn as nn
+from easydict import EasyDict
 
-from lzero.policy.utils import negative_cosine_similarity, to_torch_float_tensor
+from lzero.model.common import RepresentationNetwork
+from lzero.model.utils import renormalize
+from lzero.policy.utils import negative_cosine_similarity, to_torch_float_tensor, configure_optimizers, LayerNorm, \
+    select_action, concat_output, concat_output_value, prepare_obs
 
 
 @pytest.mark.unittest
@@ -52,3 +58,171 @@ class TestUtils():
         assert (mask_batch_func == mask_batch_2).all() and (target_value_prefix_func == target_value_prefix_2).all(
         ) and (target_value_func == target_value_2).all() and (target_policy_func == target_policy_2
                                                                ).all() and (weights_func == weights_2).all()
+
+    def test_configure_optimizers(self):
+
+        class Model(nn.Module):
+
+            def __init__(self):
+                super().__init__()
+                self.conv = nn.Sequential(nn.Conv2d(3, 8, 3), nn.BatchNorm2d(8))
+                self.lstm = nn.LSTM(input_size=4, hidden_size=8)
+                self.fc = nn.Sequential(nn.Linear(8, 8), nn.LayerNorm(8), nn.Linear(8, 2, bias=False))
+                self.ln = LayerNorm(8, bias=False)
+
+        model = Model()
+        optimizer = configure_optimizers(model, weight_decay=0.1, learning_rate=1e-3, device_type='cpu')
+        param_names = {id(p): pn for pn, p in model.named_parameters()}
+        decay_group, no_decay_group = optimizer.param_groups
+        assert decay_group['weight_decay'] == 0.1 and no_decay_group['weight_decay'] == 0.0
+        assert sorted(param_names[id(p)] for p in decay_group['params']
+                      ) == ['conv.0.weight', 'fc.0.weight', 'fc.2.weight', 'lstm.weight_hh_l0', 'lstm.weight_ih_l0']
+        assert sorted(param_names[id(p)] for p in no_decay_group['params']) == [
+            'conv.0.bias', 'conv.1.bias', 'conv.1.weight', 'fc.0.bias', 'fc.1.bias', 'fc.1.weight', 'ln.weight',
+            'lstm.bias_hh_l0', 'lstm.bias_ih_l0'
+        ]
+
+    @pytest.mark.parametrize('backend', [None, 'auto', 'foreach', 'default'])
+    def test_configure_optimizers_backend(self, backend, monkeypatch):
+        if backend is None:
+            monkeypatch.delenv('LZ_ADAMW_BACKEND', raising=False)
+        else:
+            monkeypatch.setenv('LZ_ADAMW_BACKEND', backend)
+        # a small model is below the size threshold of the fused implementation, so 'auto' selects 'foreach'.
+        # The optimizer is only constructed, so the cuda branch can be checked with cpu params.
+        model = nn.Sequential(nn.Linear(4, 8), nn.LayerNorm(8), nn.Linear(8, 2))
+        optimizer = configure_optimizers(model, weight_decay=0.1, learning_rate=1e-3, device_type='cuda')
+        if backend == 'default':
+            assert not optimizer.defaults['foreach']
+        else:
+            assert optimizer.defaults['foreach'] is True
+        assert not optimizer.defaults['fused']
+
+    def test_configure_optimizers_invalid_backend(self, monkeypatch):
+        monkeypatch.setenv('LZ_ADAMW_BACKEND', 'invalid')
+        model = nn.Linear(4, 2)
+        with pytest.raises(AssertionError):
+            configure_optimizers(model, weight_decay=0.1, learning_rate=1e-3, device_type='cuda')
+        # the backend is only considered on cuda
+        configure_optimizers(model, weight_decay=0.1, learning_rate=1e-3, device_type='cpu')
+
+    def test_select_action(self):
+        visit_counts = np.array([0, 3, 5, 2])
+        action_pos, visit_count_distribution_entropy = select_action(visit_counts, temperature=1, deterministic=True)
+        assert action_pos == 2
+        assert np.isclose(visit_count_distribution_entropy, entropy([0.3, 0.5, 0.2], base=2))
+
+        action_pos, _ = select_action(visit_counts, temperature=0.25, deterministic=False)
+        assert action_pos in [1, 2, 3]
+
+    def test_concat_output(self):
+        # the last mini-batch can be smaller than the others
+        batch_size_lst = [4, 4, 2]
+        output_lst = [
+            EasyDict(
+                value=np.random.randn(batch_size, 1),
+                value_prefix=np.random.randn(batch_size, 1),
+                policy_logits=np.random.randn(batch_size, 6),
+                latent_state=np.random.randn(batch_size, 8, 3, 3),
+                reward_hidden_state=(np.random.randn(1, batch_size, 16), np.random.randn(1, batch_size, 16)),
+            ) for batch_size in batch_size_lst
+        ]
+        value_lst, value_prefix_lst, policy_logits_lst, latent_state_lst, (
+            reward_hidden_state_c_lst, reward_hidden_state_h_lst
+        ) = concat_output(
+            output_lst, data_type='efficientzero'
+        )
+        assert (value_lst == np.concatenate([output.value for output in output_lst])).all()
+        assert (value_lst == concat_output_value(output_lst)).all()
+        assert (value_prefix_lst == np.concatenate([output.value_prefix for output in output_lst])).all()
+        assert (policy_logits_lst == np.concatenate([output.policy_logits for output in output_lst])).all()
+        assert (latent_state_lst == np.concatenate([output.latent_state for output in output_lst])).all()
+        assert reward_hidden_state_c_lst.shape == reward_hidden_state_h_lst.shape == (1, 10, 16)
+        assert (
+            reward_hidden_state_c_lst ==
+            np.concatenate([output.reward_hidden_state[0] for output in output_lst], axis=1)
+        ).all()
+        assert (
+            reward_hidden_state_h_lst ==
+            np.concatenate([output.reward_hidden_state[1] for output in output_lst], axis=1)
+        ).all()
+
+        for output in output_lst:
+            output.reward = output.pop('value_prefix')
+        value_lst, reward_lst, policy_logits_lst, latent_state_lst = concat_output(output_lst, data_type='muzero')
+        assert (reward_lst == np.concatenate([output.reward for output in output_lst])).all()
+        assert latent_state_lst.shape == (10, 8, 3, 3)
+
+        # ``initial_inference`` of the models returns the zero reward as a python list
+        for output, batch_size in zip(output_lst, batch_size_lst):
+            output.reward = [0. for _ in range(batch_size)]
+        _, reward_lst, _, _ = concat_output(output_lst, data_type='muzero')
+        assert reward_lst.shape == (10, ) and (reward_lst == 0.).all()
+
+        for output, batch_size in zip(output_lst, batch_size_lst):
+            output.value_prefix = [0. for _ in range(batch_size)]
+        value_lst, value_prefix_lst, _, _, (reward_hidden_state_c_lst, _) = concat_output(
+            output_lst, data_type='efficientzero'
+        )
+        assert value_prefix_lst.shape == (10, ) and (value_prefix_lst == 0.).all()
+        assert value_lst.shape == (10, 1) and reward_hidden_state_c_lst.shape == (1, 10, 16)
+
+    @pytest.mark.parametrize('model_type', ['conv', 'mlp'])
+    @pytest.mark.parametrize('self_supervised_learning_loss', [True, False])
+    @pytest.mark.parametrize('dtype', [np.uint8, np.float32])
+    def test_prepare_obs(self, model_type, self_supervised_learning_loss, dtype):
+        frame_stack_num, image_channel, observation_shape = 4, 3, 4
+        cfg = EasyDict(
+            dict(
+                device='cpu',
+                model=dict(
+                    model_type=model_type,
+                    frame_stack_num=frame_stack_num,
+                    image_channel=image_channel,
+                    observation_shape=observation_shape,
+                    self_supervised_learning_loss=self_supervised_learning_loss
+                )
+            )
+        )
+        if model_type == 'conv':
+            # (batch_size, (stack_num+num_unroll_steps)*C, W, H)
+            obs_batch_ori = (np.random.rand(4, 9 * image_channel, 8, 8) * 255).astype(dtype)
+        else:
+            # (batch_size, (stack_num+num_unroll_steps)*obs_shape)
+            obs_batch_ori = (np.random.rand(4, 6 * observation_shape) * 255).astype(dtype)
+        obs_batch, obs_target_batch = prepare_obs(obs_batch_ori, cfg)
+
+        # the original slicing of ``prepare_obs``
+        obs_tensor = torch.from_numpy(obs_batch_ori).float()
+        step_size = image_channel if model_type == 'conv' else observation_shape
+        assert obs_batch.dtype == torch.float32
+        # same values and same memory layout as the original slicing
+        assert torch.equal(obs_batch, obs_tensor[:, 0:frame_stack_num * step_size])
+        assert obs_batch.stride() == obs_tensor[:, 0:frame_stack_num * step_size].stride()
+        if self_supervised_learning_loss:
+            assert obs_target_batch.dtype == torch.float32
+            assert torch.equal(obs_target_batch, obs_tensor[:, step_size:])
+        else:
+            assert obs_target_batch is None
+
+    def test_prepare_obs_state_norm(self):
+        # the latent state of conv obs prepared for learning must be flattenable, as done with ``state_norm=True``
+        cfg = EasyDict(
+            dict(
+                device='cpu',
+                model=dict(
+                    model_type='conv',
+                    frame_stack_num=4,
+                    image_channel=1,
+                    observation_shape=(4, 8, 8),
+                    self_supervised_learning_loss=True
+                )
+            )
+        )
+        obs_batch_ori = np.random.rand(2, 9, 8, 8).astype(np.float32)
+        obs_batch, _ = prepare_obs(obs_batch_ori, cfg)
+        representation_network = RepresentationNetwork(
+            observation_shape=[4, 8, 8], num_res_blocks=1, num_channels=16, downsample=False
+        )
+        latent_state = renormalize(representation_network(obs_batch))
+        assert latent_state.shape == (2, 16, 8, 8)
@@ -1,5 +1,8 @@
 import logging
-from typing import List, Tuple, Dict
+import os
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Tuple, Dict, Optional, Union
 from easydict import EasyDict
 
 import numpy as np
@@ -18,16 +21,42 @@ class LayerNorm(nn.Module):
 
     def __init__(self, ndim, bias):
         super().__init__()
+        # cache the normalized shape so that ``forward`` does not rebuild it from ``self.weight.shape`` on every call
+        self.normalized_shape = torch.Size([ndim])
         self.weight = nn.Parameter(torch.ones(ndim))
         self.bias = nn.Parameter(torch.zeros(ndim)) if bias else None
 
     def forward(self, input):
-        return F.layer_norm(input, self.weight.shape, self.weight, self.bias, 1e-5)
-
-
-def configure_optimizers(model: nn.Module, weight_decay: float = 0, learning_rate: float = 3e-3,
-                         betas: tuple = (0.9, 0.999), device_type: str = "cuda"):
-
+        return F.layer_norm(input, self.normalized_shape, self.weight, self.bias, 1e-5)
+
+
+# module types whose weights will (whitelist) or will not (blacklist) be decayed by ``configure_optimizers``.
+# Modules are matched by their exact type with a hash lookup instead of ``isinstance``, subclasses are not matched.
+_WHITELIST_WEIGHT_MODULES = frozenset((torch.nn.Linear, torch.nn.LSTM, nn.Conv2d))
+_BLACKLIST_WEIGHT_MODULES = frozenset(
+    (torch.nn.LayerNorm, LayerNorm, torch.nn.Embedding, torch.nn.BatchNorm1d, torch.nn.BatchNorm2d)
+)
+# parameter name suffixes used by ``configure_optimizers``, bundled so that each check is a single ``str.endswith``
+_BIAS_SUFFIXES = ('bias', 'bias_ih_l0', 'bias_hh_l0')
+_RNN_WEIGHT_SUFFIXES = ('weight_ih_l0', 'weight_hh_l0')
+# the fused AdamW implementation is only selected automatically for models larger than this with these param dtypes
+_FUSED_ADAMW_MIN_NUM_PARAMS = 10_000_000
+_FUSED_ADAMW_DTYPES = frozenset((torch.float32, torch.bfloat16, torch.float16))
+# the AdamW implementations supported by the installed torch version, probed once at import time
+_ADAMW_BACKENDS = frozenset(
+    backend for backend in ('fused', 'foreach') if backend in inspect.signature(torch.optim.AdamW).parameters
+)
+# whether the chosen AdamW implementation has been logged, it is only logged on the first optimizer construction
+_logged_adamw_backend = False
+
+
+def configure_optimizers(
+    model: nn.Module,
+    weight_decay: float = 0,
+    learning_rate: float = 3e-3,
+    betas: tuple = (0.9, 0.999),
+    device_type: str = "cuda"
+):
     """
     Overview:
         This function is adapted from https://github.com/karpathy/nanoGPT/blob/master/model.py
@@ -46,28 +75,32 @@ def configure_optimizers(model: nn.Module, weight_decay: float = 0, learning_rat
         - optimizer (:obj:`torch.optim`): The optimizer.
     """
     # separate out all parameters to those that will and won't experience regularizing weight decay
-    decay = set()
-    no_decay = set()
-    whitelist_weight_modules = (torch.nn.Linear, torch.nn.LSTM, nn.Conv2d)
-    blacklist_weight_modules = (torch.nn.LayerNorm, LayerNorm, torch.nn.Embedding, torch.nn.BatchNorm1d, torch.nn.BatchNorm2d)
+    # dicts are used as insertion-ordered sets, so the param groups are built in the deterministic order of
+    # ``named_parameters`` and no sorting of the param names is needed
+    decay = {}
+    no_decay = {}
+    # map every full param name to the module that directly owns it (non-recursively), so that each parameter is
+    # visited only once below instead of once per ancestor module.
+    parent_of = {}
     for mn, m in model.named_modules():
-        for pn, p in m.named_parameters():
-            fpn = '%s.%s' % (mn, pn) if mn else pn  # full param name
-            # random note: because named_modules and named_parameters are recursive
-            # we will see the same tensors p many many times. but doing it this way
-            # allows us to know which parent module any tensor p belongs to...
-            if pn.endswith('bias') or pn.endswith('lstm.bias_ih_l0') or pn.endswith('lstm.bias_hh_l0'):
-                # all biases will not be decayed
-                no_decay.add(fpn)
-            elif pn.endswith('weight') and isinstance(m, whitelist_weight_modules):
-                # weights of whitelist modules will be weight decayed
-                decay.add(fpn)
-            elif (pn.endswith('weight_ih_l0') or pn.endswith('weight_hh_l0')) and isinstance(m, whitelist_weight_modules):
-                # some special weights of whitelist modules will be weight decayed
-                decay.add(fpn)
-            elif pn.endswith('weight') and isinstance(m, blacklist_weight_modules):
-                # weights of blacklist modules will NOT be weight decayed
-                no_decay.add(fpn)
+        for pn, p in m._parameters.items():
+            if p is not None:
+                parent_of['%s.%s' % (mn, pn) if mn else pn] = m  # full param name
+    for fpn, _ in model.named_parameters():
+        m_type = type(parent_of[fpn])
+        is_whitelist_module = m_type in _WHITELIST_WEIGHT_MODULES
+        if fpn.endswith(_BIAS_SUFFIXES):
+            # all biases will not be decayed
+            no_decay[fpn] = None
+        elif is_whitelist_module and fpn.endswith('weight'):
+            # weights of whitelist modules will be weight decayed
+            decay[fpn] = None
+        elif is_whitelist_module and fpn.endswith(_RNN_WEIGHT_SUFFIXES):
+            # some special weights of whitelist modules will be weight decayed
+            decay[fpn] = None
+        elif fpn.endswith('weight') and m_type in _BLACKLIST_WEIGHT_MODULES:
+            # weights of blacklist modules will NOT be weight decayed
+            no_decay[fpn] = None
     try:
         # subtle: 'transformer.wte.weight' and 'lm_head.weight' are tied, so they
         # will appear in the no_decay and decay sets respectively after the above.
@@ -75,51 +108,67 @@ def configure_optimizers(model: nn.Module, weight_decay: float = 0, learning_rat
         # will only return the first occurence, key'd by 'transformer.wte.weight', below.
         # so let's manually remove 'lm_head.weight' from decay set. This will include
         # this tensor into optimization via transformer.wte.weight only, and not decayed.
-        decay.remove('lm_head.weight')
+        del decay['lm_head.weight']
     except KeyError:
         logging.info("lm_head.weight not found in decay set, so not removing it")
 
     # validate that we considered every parameter
     param_dict = {pn: p for pn, p in model.named_parameters()}
-    inter_params = decay & no_decay
-    union_params = decay | no_decay
-    assert len(inter_params) == 0, "parameters %s made it into both decay/no_decay sets!" % (str(inter_params),)
+    inter_params = decay.keys() & no_decay.keys()
+    union_params = decay.keys() | no_decay.keys()
+    assert len(inter_params) == 0, "parameters %s made it into both decay/no_decay sets!" % (str(inter_params), )
     assert len(
         param_dict.keys() - union_params) == 0, "parameters %s were not separated into either decay/no_decay set!" \
                                                 % (str(param_dict.keys() - union_params),)
 
     # create the pytorch optimizer object
     optim_groups = [
-        {"params": [param_dict[pn] for pn in sorted(list(decay))], "weight_decay": weight_decay},
-        {"params": [param_dict[pn] for pn in sorted(list(no_decay))], "weight_decay": 0.0},
+        {
+            "params": [param_dict[pn] for pn in decay],
+            "weight_decay": weight_decay
+        },
+        {
+            "params": [param_dict[pn] for pn in no_decay],
+            "weight_decay": 0.0
+        },
     ]
-    # new PyTorch nightly has a new 'fused' option for AdamW that is much faster
-    use_fused = (device_type == 'cuda') and ('fused' in inspect.signature(torch.optim.AdamW).parameters)
-    print(f"using fused AdamW: {use_fused}")
-    extra_args = dict(fused=True) if use_fused else dict()
+    # new PyTorch versions have 'fused' and 'foreach' implementations of AdamW that are much faster on cuda.
+    # 'fused' is only a win for large models with plain floating point params, otherwise 'foreach' is preferred.
+    # The choice can be overridden with the ``LZ_ADAMW_BACKEND`` environment variable.
+    extra_args = dict()
+    if device_type == 'cuda':
+        backend = os.environ.get('LZ_ADAMW_BACKEND', 'auto')
+        assert backend in ['auto', 'fused', 'foreach', 'default'], \
+            "LZ_ADAMW_BACKEND should be 'auto', 'fused', 'foreach' or 'default', but got {}".format(backend)
+        if backend == 'auto':
+            num_params = sum(p.numel() for p in param_dict.values())
+            param_dtypes = {p.dtype for p in param_dict.values()}
+            if num_params > _FUSED_ADAMW_MIN_NUM_PARAMS and param_dtypes <= _FUSED_ADAMW_DTYPES:
+                backend = 'fused'
+            else:
+                backend = 'foreach'
+        if backend in _ADAMW_BACKENDS:
+            extra_args[backend] = True
+        elif backend != 'default':
+            logging.warning(
+                "AdamW implementation '%s' is not supported by the installed torch version, use the default one",
+                backend
+            )
+    global _logged_adamw_backend
+    if not _logged_adamw_backend:
+        logging.info("AdamW implementation: %s", next(iter(extra_args), 'default'))
+        _logged_adamw_backend = True
     optimizer = torch.optim.AdamW(optim_groups, lr=learning_rate, betas=betas, **extra_args)
 
     return optimizer
 
 
-def prepare_obs(obs_batch_ori: np.ndarray, cfg: EasyDict) -> Tuple[torch.Tensor, torch.Tensor]:
+def _stack_conv_obs(
+        obs_batch_ori: torch.Tensor, frame_stack_num: int, image_channel: int, self_supervised_learning_loss: bool
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
     """
     Overview:
-        Prepare the observations for the model, including:
-        1. convert the obs to torch tensor
-        2. stack the obs
-        3. calculate the consistency loss
-    Arguments:
-        - obs_batch_ori (:obj:`np.ndarray`): the original observations in a batch style
-        - cfg (:obj:`EasyDict`): the config dict
-    Returns:
-        - obs_batch (:obj:`torch.Tensor`): the stacked observations
-        - obs_target_batch (:obj:`torch.Tensor`): the stacked observations for calculating consistency loss
-    """
-    obs_target_batch = None
-    if cfg.model.model_type == 'conv':
-        # for 3-dimensional image obs
-        """
+        Stack the 3-dimensional image obs for ``prepare_obs``.
         ``obs_batch_ori`` is the original observations in a batch style, shape is:
         (batch_size, stack_num+num_unroll_steps, W, H, C) -> (batch_size, (stack_num+num_unroll_steps)*C, W, H )
 
@@ -130,19 +179,25 @@ def prepare_obs(obs_batch_ori: np.ndarray, cfg: EasyDict) -> Tuple[torch.Tensor,
         timestep t:     1,   2,   3,  4,    5,   6,   7,   8,     9
         channel_num:    3    3    3   3     3    3    3    3      3
                        ---, ---, ---, ---,  ---, ---, ---, ---,   ---
-        """
-        obs_batch_ori = torch.from_numpy(obs_batch_ori).to(cfg.device).float()
-        # ``obs_batch`` is used in ``initial_inference()``, which is the first stacked obs at timestep t in
-        # ``obs_batch_ori``. shape is (4, 4*3, 96, 96) = (4, 12, 96, 96)
-        obs_batch = obs_batch_ori[:, 0:cfg.model.frame_stack_num * cfg.model.image_channel, :, :]
-
-        if cfg.model.self_supervised_learning_loss:
-            # ``obs_target_batch`` is only used for calculate consistency loss, which take the all obs other than
-            # timestep t1, and is only performed in the last 8 timesteps in the second dim in ``obs_batch_ori``.
-            obs_target_batch = obs_batch_ori[:, cfg.model.image_channel:, :, :]
-    elif cfg.model.model_type == 'mlp':
-        # for 1-dimensional vector obs
-        """
+    """
+    obs_target_batch = None
+    # ``obs_batch`` is used in ``initial_inference()``, which is the first stacked obs at timestep t in
+    # ``obs_batch_ori``. shape is (4, 4*3, 96, 96) = (4, 12, 96, 96)
+    obs_batch = obs_batch_ori[:, 0:frame_stack_num * image_channel, :, :]
+
+    if self_supervised_learning_loss:
+        # ``obs_target_batch`` is only used for calculate consistency loss, which take the all obs other than
+        # timestep t1, and is only performed in the last 8 timesteps in the second dim in ``obs_batch_ori``.
+        obs_target_batch = obs_batch_ori[:, image_channel:, :, :]
+    return obs_batch, obs_target_batch
+
+
+def _stack_mlp_obs(
+        obs_batch_ori: torch.Tensor, frame_stack_num: int, observation_shape: int, self_supervised_learning_loss: bool
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    """
+    Overview:
+        Stack the 1-dimensional vector obs for ``prepare_obs``.
         ``obs_batch_ori`` is the original observations in a batch style, shape is:
         (batch_size, stack_num+num_unroll_steps, obs_shape) -> (batch_size, (stack_num+num_unroll_steps)*obs_shape)
 
@@ -153,18 +208,57 @@ def prepare_obs(obs_batch_ori: np.ndarray, cfg: EasyDict) -> Tuple[torch.Tensor,
         timestep t:     1,   2,      3,     4,    5,   6,
         obs_shape:      4    4       4      4     4    4
                        ----, ----,  ----, ----,  ----,  ----,
-        """
-        obs_batch_ori = torch.from_numpy(obs_batch_ori).to(cfg.device).float()
-        # ``obs_batch`` is used in ``initial_inference()``, which is the first stacked obs at timestep t1 in
-        # ``obs_batch_ori``. shape is (4, 4*3) = (4, 12)
-        obs_batch = obs_batch_ori[:, 0:cfg.model.frame_stack_num * cfg.model.observation_shape]
+    """
+    obs_target_batch = None
+    # ``obs_batch`` is used in ``initial_inference()``, which is the first stacked obs at timestep t1 in
+    # ``obs_batch_ori``. shape is (4, 4*3) = (4, 12)
+    obs_batch = obs_batch_ori[:, 0:frame_stack_num * observation_shape]
+
+    if self_supervised_learning_loss:
+        # ``obs_target_batch`` is only used for calculate consistency loss, which take the all obs other than
+        # timestep t1, and is only performed in the last 8 timesteps in the second dim in ``obs_batch_ori``.
+        obs_target_batch = obs_batch_ori[:, observation_shape:]
+    return obs_batch, obs_target_batch
 
-        if cfg.model.self_supervised_learning_loss:
-            # ``obs_target_batch`` is only used for calculate consistency loss, which take the all obs other than
-            # timestep t1, and is only performed in the last 8 timesteps in the second dim in ``obs_batch_ori``.
-            obs_target_batch = obs_batch_ori[:, cfg.model.observation_shape:]
 
-    return obs_batch, obs_target_batch
+# model_type -> (the function stacking the obs, the key of the per-timestep obs size in ``cfg.model``)
+_STACK_OBS_FNS = {
+    'conv': (_stack_conv_obs, 'image_channel'),
+    'mlp': (_stack_mlp_obs, 'observation_shape'),
+}
+
+
+def prepare_obs(obs_batch_ori: np.ndarray, cfg: EasyDict) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    """
+    Overview:
+        Prepare the observations for the model, including:
+        1. convert the obs to torch tensor
+        2. stack the obs
+        3. calculate the consistency loss
+    Arguments:
+        - obs_batch_ori (:obj:`np.ndarray`): the original observations in a batch style
+        - cfg (:obj:`EasyDict`): the config dict
+    Returns:
+        - obs_batch (:obj:`torch.Tensor`): the stacked observations
+        - obs_target_batch (:obj:`Optional[torch.Tensor]`): the stacked observations for calculating consistency \
+            loss, None if ``self_supervised_learning_loss`` is disabled
+    """
+    # read the config once, every attribute access of ``EasyDict`` is a python-level lookup
+    model_cfg = cfg.model
+    stack_obs_fn, obs_step_size_key = _STACK_OBS_FNS[model_cfg.model_type]
+    device = torch.device(cfg.device)
+
+    obs_batch_ori = torch.from_numpy(np.ascontiguousarray(obs_batch_ori))
+    if device.type == 'cuda':
+        obs_batch_ori = obs_batch_ori.pin_memory()
+    # transfer the obs in its original dtype (e.g. uint8 for unscaled image obs) and cast it to float on the device,
+    # which moves up to 4x fewer bytes across PCIe than casting to float32 on the host first. A non-blocking copy
+    # with a target dtype does the copy and the cast in a single call.
+    obs_batch_ori = obs_batch_ori.to(device=device, dtype=torch.float32, non_blocking=True)
+
+    return stack_obs_fn(
+        obs_batch_ori, model_cfg.frame_stack_num, model_cfg[obs_step_size_key], model_cfg.self_supervised_learning_loss
+    )
 
 
 def negative_cosine_similarity(x1: torch.Tensor, x2: torch.Tensor) -> torch.Tensor:
@@ -184,22 +278,25 @@ def negative_cosine_similarity(x1: torch.Tensor, x2: torch.Tensor) -> torch.Tens
     Reference:
         https://en.wikipedia.org/wiki/Cosine_similarity
     """
-    x1 = F.normalize(x1, p=2., dim=-1, eps=1e-5)
-    x2 = F.normalize(x2, p=2., dim=-1, eps=1e-5)
-    return -(x1 * x2).sum(dim=1)
+    # divide the row-wise dot product by the product of the norms (each clamped with ``eps`` like ``F.normalize``),
+    # so that only the elementwise product is materialized instead of the two normalized (batch_size, dim) tensors.
+    dot = (x1 * x2).sum(dim=-1)
+    norm = x1.norm(p=2., dim=-1).clamp_min(1e-5) * x2.norm(p=2., dim=-1).clamp_min(1e-5)
+    return -dot / norm
 
 
-def get_max_entropy(action_shape: int) -> np.float32:
+@lru_cache(maxsize=16)
+def get_max_entropy(action_shape: int) -> float:
     """
     Overview:
-        get the max entropy of the action space.
+        get the max entropy of the action space, i.e. the entropy of the uniform distribution, \
+        ``-n * (1/n) * log2(1/n) = log2(n)``. The result is cached since ``action_shape`` is fixed for a run.
     Arguments:
         - action_shape (:obj:`int`): the shape of the action space
     Returns:
         - max_entropy (:obj:`float`): the max entropy of the action space
     """
-    p = 1.0 / action_shape
-    return -action_shape * p * np.log2(p)
+    return math.log2(action_shape)
 
 
 def select_action(visit_counts: np.ndarray,
@@ -217,11 +314,12 @@ def select_action(visit_counts: np.ndarray,
         - action_pos (:obj:`np.int64`): The selected action position (index).
         - visit_count_distribution_entropy (:obj:`np.ndarray`): The entropy of the visit count distribution.
     """
-    action_probs = [visit_count_i ** (1 / temperature) for visit_count_i in visit_counts]
-    action_probs = [x / sum(action_probs) for x in action_probs]
+    visit_counts = np.asarray(visit_counts, dtype=np.float64)
+    action_probs = np.power(visit_counts, 1 / temperature)
+    action_probs /= action_probs.sum()
 
     if deterministic:
-        action_pos = np.argmax([v for v in visit_counts])
+        action_pos = np.argmax(visit_counts)
     else:
         action_pos = np.random.choice(len(visit_counts), p=action_probs)
 
@@ -229,6 +327,20 @@ def select_action(visit_counts: np.ndarray,
     return action_pos, visit_count_distribution_entropy
 
 
+def _empty_concat(array: Union[np.ndarray, List], batch_size: int, batch_dim: int = 0) -> np.ndarray:
+    """
+    Overview:
+        allocate an uninitialized array like ``array`` but with ``batch_size`` along ``batch_dim``, i.e. the \
+        destination of the concatenation of mini-batches like ``array`` along ``batch_dim``.
+    .. note::
+        ``array`` can also be a python list, e.g. the zero ``reward``/``value_prefix`` placeholder \
+        ``[0. for _ in range(batch_size)]`` returned by ``initial_inference`` of the models.
+    """
+    array = np.asarray(array)
+    shape = array.shape[:batch_dim] + (batch_size, ) + array.shape[batch_dim + 1:]
+    return np.empty(shape, dtype=array.dtype)
+
+
 def concat_output_value(output_lst: List) -> np.ndarray:
     """
     Overview:
@@ -238,101 +350,173 @@ def concat_output_value(output_lst: List) -> np.ndarray:
     Returns:
         - value_lst (:obj:`np.array`): the values of the model output list
     """
-    # concat the values of the model output list
-    value_lst = []
-    for output in output_lst:
-        value_lst.append(output.value)
+    # concat the values of the model output list into a preallocated array
+    batch_size = sum(output.value.shape[0] for output in output_lst)
+    value_lst = _empty_concat(output_lst[0].value, batch_size)
 
-    value_lst = np.concatenate(value_lst)
+    begin_index = 0
+    for output in output_lst:
+        end_index = begin_index + output.value.shape[0]
+        value_lst[begin_index:end_index] = output.value
+        begin_index = end_index
 
     return value_lst
 
 
+def _concat_output_muzero(output_lst: List) -> Tuple:
+    """
+    Overview:
+        the ``concat_output`` specialized for the muzero model output.
+    """
+    first_output = output_lst[0]
+    batch_size = sum(output.value.shape[0] for output in output_lst)
+    value_lst = _empty_concat(first_output.value, batch_size)
+    reward_lst = _empty_concat(first_output.reward, batch_size)
+    policy_logits_lst = _empty_concat(first_output.policy_logits, batch_size)
+    latent_state_lst = _empty_concat(first_output.latent_state, batch_size)
+
+    begin_index = 0
+    for output in output_lst:
+        end_index = begin_index + output.value.shape[0]
+        value_lst[begin_index:end_index] = output.value
+        reward_lst[begin_index:end_index] = output.reward
+        policy_logits_lst[begin_index:end_index] = output.policy_logits
+        latent_state_lst[begin_index:end_index] = output.latent_state
+        begin_index = end_index
+
+    return value_lst, reward_lst, policy_logits_lst, latent_state_lst
+
+
+def _concat_output_efficientzero(output_lst: List) -> Tuple:
+    """
+    Overview:
+        the ``concat_output`` specialized for the efficientzero model output.
+    """
+    first_output = output_lst[0]
+    batch_size = sum(output.value.shape[0] for output in output_lst)
+    value_lst = _empty_concat(first_output.value, batch_size)
+    value_prefix_lst = _empty_concat(first_output.value_prefix, batch_size)
+    policy_logits_lst = _empty_concat(first_output.policy_logits, batch_size)
+    latent_state_lst = _empty_concat(first_output.latent_state, batch_size)
+    # the reward hidden states have shape (1, mini_batch_size, lstm_hidden_size)
+    reward_hidden_state_c_lst = _empty_concat(first_output.reward_hidden_state[0], batch_size, batch_dim=1)
+    reward_hidden_state_h_lst = _empty_concat(first_output.reward_hidden_state[1], batch_size, batch_dim=1)
+
+    begin_index = 0
+    for output in output_lst:
+        end_index = begin_index + output.value.shape[0]
+        value_lst[begin_index:end_index] = output.value
+        value_prefix_lst[begin_index:end_index] = output.value_prefix
+        policy_logits_lst[begin_index:end_index] = output.policy_logits
+        latent_state_lst[begin_index:end_index] = output.latent_state
+        # index away the leading dim of size 1 instead of squeezing and broadcasting it back
+        reward_hidden_state_c_lst[0, begin_index:end_index] = output.reward_hidden_state[0][0]
+        reward_hidden_state_h_lst[0, begin_index:end_index] = output.reward_hidden_state[1][0]
+        begin_index = end_index
+
+    return value_lst, value_prefix_lst, policy_logits_lst, latent_state_lst, (
+        reward_hidden_state_c_lst, reward_hidden_state_h_lst
+    )
+
+
+_CONCAT_OUTPUT_FNS = {
+    'muzero': _concat_output_muzero,
+    'efficientzero': _concat_output_efficientzero,
+}
+
+
 def concat_output(output_lst: List, data_type: str = 'muzero') -> Tuple:
     """
     Overview:
-        concat the model output.
+        concat the model output. The outputs are copied into preallocated arrays in a single pass over \
+        ``output_lst``, by a function specialized for each ``data_type``.
     Arguments:
         - output_lst (:obj:`List`): The model output list.
         - data_type (:obj:`str`): The data type, should be 'muzero' or 'efficientzero'.
     Returns:
         - value_lst (:obj:`np.array`): the values of the model output list
     """
-    assert data_type in ['muzero', 'efficientzero'], "data_type should be 'muzero' or 'efficientzero'"
-    # concat the model output
-    value_lst, reward_lst, policy_logits_lst, latent_state_lst = [], [], [], []
-    reward_hidden_state_c_lst, reward_hidden_state_h_lst = [], []
-    for output in output_lst:
-        value_lst.append(output.value)
-        if data_type == 'muzero':
-            reward_lst.append(output.reward)
-        elif data_type == 'efficientzero':
-            reward_lst.append(output.value_prefix)
-
-        policy_logits_lst.append(output.policy_logits)
-        latent_state_lst.append(output.latent_state)
-        if data_type == 'efficientzero':
-            reward_hidden_state_c_lst.append(output.reward_hidden_state[0].squeeze(0))
-            reward_hidden_state_h_lst.append(output.reward_hidden_state[1].squeeze(0))
-
-    value_lst = np.concatenate(value_lst)
-    reward_lst = np.concatenate(reward_lst)
-    policy_logits_lst = np.concatenate(policy_logits_lst)
-    latent_state_lst = np.concatenate(latent_state_lst)
-    if data_type == 'muzero':
-        return value_lst, reward_lst, policy_logits_lst, latent_state_lst
-    elif data_type == 'efficientzero':
-        reward_hidden_state_c_lst = np.expand_dims(np.concatenate(reward_hidden_state_c_lst), axis=0)
-        reward_hidden_state_h_lst = np.expand_dims(np.concatenate(reward_hidden_state_h_lst), axis=0)
-        return value_lst, reward_lst, policy_logits_lst, latent_state_lst, (
-            reward_hidden_state_c_lst, reward_hidden_state_h_lst
-        )
-
-
-def to_torch_float_tensor(data_list: List[np.ndarray], device: torch.device) -> List[torch.Tensor]:
+    assert data_type in _CONCAT_OUTPUT_FNS, "data_type should be 'muzero' or 'efficientzero'"
+    return _CONCAT_OUTPUT_FNS[data_type](output_lst)
+
+
+def to_torch_float_tensor(
+        data_list: List[np.ndarray],
+        device: torch.device,
+        stream: Optional[torch.cuda.Stream] = None
+) -> List[torch.Tensor]:
     """
     Overview:
-        convert the data list to torch float tensor
+        convert the data list to torch float tensor. When the target device is cuda, every array is staged in \
+        pinned memory and copied asynchronously, so that the host-to-device copies of the whole list do not \
+        block the host one after another.
     Arguments:
         - data_list (:obj:`List`): The data list.
         - device (:obj:`torch.device`): The device.
+        - stream (:obj:`torch.cuda.Stream`): The cuda stream used to issue the copies, default to the current \
+            stream. If a side stream is given, the caller is responsible for synchronizing it with the stream \
+            that consumes the output tensors.
     Returns:
         - output_data_list (:obj:`List`): The output data list.
     """
-    output_data_list = []
-    for data in data_list:
-        output_data_list.append(torch.from_numpy(data).to(device).float())
+    device = torch.device(device)
+    if device.type != 'cuda':
+        return [torch.from_numpy(data).to(device, dtype=torch.float32) for data in data_list]
+
+    with torch.cuda.stream(stream):
+        output_data_list = [
+            torch.from_numpy(data).pin_memory().to(device, dtype=torch.float32, non_blocking=True) for data in data_list
+        ]
     return output_data_list
 
 
 def to_detach_cpu_numpy(data_list: List[torch.Tensor]) -> List[np.ndarray]:
     """
     Overview:
-        convert the data list to detach cpu numpy.
+        convert the data list to detach cpu numpy. The device-to-host copies of cuda tensors are all issued \
+        asynchronously into pinned memory and waited for only once, instead of blocking on every tensor.
     Arguments:
         - data_list (:obj:`List`): the data list
     Returns:
         - output_data_list (:obj:`List`): the output data list
     """
-    output_data_list = []
+    host_data_list = []
+    cuda_devices = set()
     for data in data_list:
-        output_data_list.append(data.detach().cpu().numpy())
+        data = data.detach()
+        if data.is_cuda:
+            host_data = torch.empty(data.shape, dtype=data.dtype, pin_memory=True)
+            host_data.copy_(data, non_blocking=True)
+            cuda_devices.add(data.device)
+            data = host_data
+        host_data_list.append(data)
+    for device in cuda_devices:
+        torch.cuda.current_stream(device).synchronize()
+
+    output_data_list = [data.numpy() for data in host_data_list]
     return output_data_list
 
 
+# fetch all the fields of a network output with a single C-level call, in the order returned by the unpack functions
+_EZ_NETWORK_OUTPUT_GETTER = attrgetter('latent_state', 'value_prefix', 'reward_hidden_state', 'value', 'policy_logits')
+_MZ_NETWORK_OUTPUT_GETTER = attrgetter('latent_state', 'reward', 'value', 'policy_logits')
+
+
 def ez_network_output_unpack(network_output: Dict) -> Tuple:
     """
     Overview:
         unpack the network output of efficientzero
     Arguments:
         - network_output (:obj:`Tuple`): the network output of efficientzero
+    Returns:
+        - latent_state (:obj:`torch.Tensor`): shape (batch_size, lstm_hidden_size, num_unroll_steps+1, \
+            num_unroll_steps+1)
+        - value_prefix (:obj:`torch.Tensor`): shape (batch_size, support_support_size)
+        - reward_hidden_state (:obj:`Tuple`): shape {tuple: 2} -> (1, batch_size, 512)
+        - value (:obj:`torch.Tensor`): shape (batch_size, support_support_size)
+        - policy_logits (:obj:`torch.Tensor`): shape (batch_size, action_space_size)
     """
-    latent_state = network_output.latent_state  # shape:（batch_size, lstm_hidden_size, num_unroll_steps+1, num_unroll_steps+1）
-    value_prefix = network_output.value_prefix  # shape: (batch_size, support_support_size)
-    reward_hidden_state = network_output.reward_hidden_state  # shape: {tuple: 2} -> (1, batch_size, 512)
-    value = network_output.value  # shape: (batch_size, support_support_size)
-    policy_logits = network_output.policy_logits  # shape: (batch_size, action_space_size)
-    return latent_state, value_prefix, reward_hidden_state, value, policy_logits
+    return _EZ_NETWORK_OUTPUT_GETTER(network_output)
 
 
 def mz_network_output_unpack(network_output: Dict) -> Tuple:
@@ -341,9 +525,11 @@ def mz_network_output_unpack(network_output: Dict) -> Tuple:
         unpack the network output of muzero
     Arguments:
         - network_output (:obj:`Tuple`): the network output of muzero
+    Returns:
+        - latent_state (:obj:`torch.Tensor`): shape (batch_size, lstm_hidden_size, num_unroll_steps+1, \
+            num_unroll_steps+1)
+        - reward (:obj:`torch.Tensor`): shape (batch_size, support_support_size)
+        - value (:obj:`torch.Tensor`): shape (batch_size, support_support_size)
+        - policy_logits (:obj:`torch.Tensor`): shape (batch_size, action_space_size)
     """
-    latent_state = network_output.latent_state  # shape:（batch_size, lstm_hidden_size, num_unroll_steps+1, num_unroll_steps+1）
-    reward = network_output.reward  # shape: (batch_size, support_support_size)
-    value = network_output.value  # shape: (batch_size, support_support_size)
-    policy_logits = network_output.policy_logits  # shape: (batch_size, action_space_size)
-    return latent_state, reward, value, policy_logits
+    return _MZ_NETWORK_OUTPUT_GETTER(network_output)